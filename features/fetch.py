@@ -0,0 +1,19 @@
+import asyncio
+
+MAX_RETRIES = 3
+
+async def fetch_html(client, url, headers, limiter=None, retries=MAX_RETRIES):
+    # 抓取页面 HTML, 遇到 429 时按 Retry-After 等待后重试, 失败时抛出异常
+    for attempt in range(retries):
+        if limiter is not None:
+            await limiter.acquire()
+        response = await client.get(url, headers=headers, timeout=10)
+        if response.status_code == 429 and attempt + 1 < retries:
+            try:
+                delay = max(float(response.headers.get("Retry-After")), 0)
+            except (TypeError, ValueError):
+                delay = 2 ** (attempt + 1)
+            await asyncio.sleep(delay)
+            continue
+        response.raise_for_status()
+        return response.content.decode('utf-8')
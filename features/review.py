@@ -1,16 +1,14 @@
 from bs4 import BeautifulSoup
-from urllib import request, parse
-def get_steam_review_info(appid,userid):
+from features.fetch import fetch_html
+async def get_steam_review_info(client, appid, userid, limiter=None):
     # 构造请求 URL 和 Headers
     url = f"https://steamcommunity.com/profiles/{userid}/recommended/{appid}"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
     }
-    req = request.Request(url, headers=headers)
 
     try:
-        with request.urlopen(req, timeout=10) as response:
-            html = response.read().decode('utf-8')
+        html = await fetch_html(client, url, headers, limiter)
     except Exception as e:
         #print(f"请求失败: AppID {appid}, 错误: {e}")
         return ''
@@ -1,19 +1,13 @@
 from bs4 import BeautifulSoup
-from urllib import request, parse
-from http import cookiejar
-def get_steam_store_info(appid):
+from features.fetch import fetch_html
+async def get_steam_store_info(client, appid, limiter=None):
     # 构造请求 URL 和 Headers
     url = f"https://store.steampowered.com/app/{appid}/?l=schinese"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
     }
     
-    # 设置 Cookies（用于绕过年龄验证）
-    cj = cookiejar.CookieJar()
-    opener = request.build_opener(request.HTTPCookieProcessor(cj))
-    request.install_opener(opener)
-
-    # 手动添加 Cookie
+    # 手动添加 Cookie（用于绕过年龄验证）
     cookies = {
         'birthtime': '568022401',
         'lastagecheckage': '1-January-1990',
@@ -23,17 +17,13 @@ def get_steam_store_info(appid):
     cookie_str = "; ".join([f"{key}={value}" for key, value in cookies.items()])
     headers['Cookie'] = cookie_str
 
-    # 创建请求
-    req = request.Request(url, headers=headers)
-
     metainfo = {
         'info': '',
         'tag': []
     }
 
     try:
-        with request.urlopen(req, timeout=10) as response:
-            html = response.read().decode('utf-8')
+        html = await fetch_html(client, url, headers, limiter)
     except Exception as e:
         print(f"请求失败: AppID {appid}, 错误: {e}")
         return metainfo
@@ -1,9 +1,16 @@
 import argparse
-import requests
+import asyncio
+import hashlib
+import httpx
+import orjson
 import time
 import os
 import logging
 import json
+import operator
+import random
+from dataclasses import dataclass
+from urllib.parse import urlparse
 from features.review import get_steam_review_info
 from features.steamstore import get_steam_store_info
 
@@ -16,6 +23,15 @@ include_played_free_games = os.environ.get("include_played_free_games") or 'true
 enable_item_update = os.environ.get("enable_item_update") or 'true'
 enable_filter = os.environ.get("enable_filter") or 'false'
 
+NOTION_HEADERS = {
+    "Authorization": f"Bearer {NOTION_API_KEY}",
+    "Content-Type": "application/json",
+    "Notion-Version": "2022-06-28",
+}
+STORE_URL_FMT = "https://store.steampowered.com/app/{}"
+ICON_URL_FMT = "https://media.steampowered.com/steamcommunity/public/images/apps/{}/{}.jpg"
+COVER_URL_FMT = "https://steamcdn-a.akamaihd.net/steam/apps/{}/header.jpg"
+
 # 属性映射 - 根据数据库实际类型更新
 PROPERTY_MAPPING = {
     "TITLE": "游戏名称",
@@ -46,88 +62,215 @@ PROPERTY_TYPES = {
 
 # MISC
 MAX_RETRIES = 20
-RETRY_DELAY = 2
+MAX_RETRY_DELAY = 60
+MAX_CONCURRENCY = 16
+NOTION_WRITE_CONCURRENCY = 8
+KEEPALIVE_TIMEOUT = 60  # 空闲连接保活时间(秒), 复用 TCP/TLS 连接
+REQUEST_TIMEOUT = 30
+ACHIEVEMENTS_CACHE_PATH = os.path.join(".cache", "achievements.json")
+ACHIEVEMENTS_CACHE_TTL = 30 * 24 * 3600  # 无成就游戏的缓存有效期(秒)
 
 logger = logging.getLogger(__name__)
 
-def send_request_with_retry(url, headers=None, json_data=None, params=None, retries=MAX_RETRIES, method="patch"):
-    response = None
-    while retries > 0:
-        try:
-            if method == "patch":
-                response = requests.patch(url, headers=headers, json=json_data, params=params)
-            elif method == "post":
-                response = requests.post(url, headers=headers, json=json_data, params=params)
-            elif method == "get":
-                response = requests.get(url, headers=headers, params=params)
-
-            response.raise_for_status()
-            return response
-        except requests.exceptions.RequestException as e:
-            error_text = response.text if response is not None else "No response"
-            logger.error(f"请求异常: <{e}> .错误: {error_text}, 重试中....")
-            retries -= 1
-            if retries > 0:
-                time.sleep(RETRY_DELAY)
+@dataclass
+class DbSchema:
+    """数据库中完成度和游戏标签属性的实际类型"""
+    completion_kind: str
+    tags_kind: str
+
+# 数据库验证完成前按 PROPERTY_TYPES 中的类型构造属性
+DEFAULT_SCHEMA = DbSchema(
+    completion_kind=PROPERTY_TYPES[PROPERTY_MAPPING["COMPLETION"]],
+    tags_kind=PROPERTY_TYPES[PROPERTY_MAPPING["TAGS"]],
+)
+
+def _completion_multiselect(completion):
+    completion_value = []
+    if completion >= 0:
+        completion_value = [{"name": f"{completion}%"}]
+    return {"type": "multi_select", "multi_select": completion_value}
+
+def _completion_number(completion):
+    return {"type": "number", "number": completion}
+
+def _tags_checkbox(tags):
+    return {"type": "checkbox", "checkbox": len(tags) > 0}
+
+def _tags_multiselect(tags):
+    return {"type": "multi_select", "multi_select": tags}
+
+def normalize_tags(raw_tags):
+    # 确保标签格式正确 - 每个标签应该是 {"name": "标签名称"} 格式
+    tags = []
+    for tag in raw_tags:
+        if isinstance(tag, dict):
+            # 如果标签已经是字典格式，确保它有 'name' 字段
+            if 'name' in tag:
+                tags.append({"name": tag['name']})
             else:
-                logger.error(f"超过最大重试次数.错误: {error_text}, 放弃.")
+                # 处理没有 'name' 字段的情况
+                logger.warning("无效标签格式: %s", tag)
+        else:
+            # 如果标签是字符串，直接使用
+            tags.append({"name": str(tag)})
+    return tags
+
+def apply_database_schema(schema):
+    """根据数据库实际类型选定属性构造函数, 启动时调用一次"""
+    global _build_completion, _build_tags
+    # 完成度默认使用数字类型, 游戏标签默认使用多选类型
+    _build_completion = _completion_multiselect if schema.completion_kind == "multi_select" else _completion_number
+    _build_tags = _tags_checkbox if schema.tags_kind == "checkbox" else _tags_multiselect
+
+apply_database_schema(DEFAULT_SCHEMA)
+
+# {str(appid): {"total", "achieved", "playtime", "ts"}}
+achievements_cache = {}
+
+class AsyncRateLimiter:
+    """令牌桶限流器: 每秒补充 rate 个令牌, 最多积攒 capacity 个"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        # 在首次调用时创建, 确保锁绑定到 asyncio.run 的事件循环
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.updated = time.monotonic()
+            self.tokens -= 1
+
+# Steam 公共 API 约 200 次/5 分钟, Notion 约 3 次/秒
+steam_limiter = AsyncRateLimiter(rate=0.6, capacity=10)
+# 商店页和社区评测页是网页抓取, 单独限流
+steam_web_limiter = AsyncRateLimiter(rate=1, capacity=5)
+notion_limiter = AsyncRateLimiter(rate=2.5, capacity=5)
+RATE_LIMITERS = {
+    "api.steampowered.com": steam_limiter,
+    "store.steampowered.com": steam_web_limiter,
+    "steamcommunity.com": steam_web_limiter,
+    "api.notion.com": notion_limiter,
+}
+
+def get_rate_limiter(url):
+    return RATE_LIMITERS.get(urlparse(url).hostname)
+
+def parse_retry_after(value, default):
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return default
+
+def get_retry_delay(attempt):
+    """指数退避并加入随机抖动, 避免并发请求同时重试"""
+    return min(MAX_RETRY_DELAY, 2 ** attempt) + random.uniform(0, 1)
+
+async def send_request_with_retry(client, url, headers=None, json_data=None, params=None, retries=MAX_RETRIES, method="patch", accept_statuses=()):
+    """发送请求并返回解析后的 JSON, 失败返回 {}; accept_statuses 中的错误状态码同样返回响应内容"""
+    limiter = get_rate_limiter(url)
+    error_text = "No response"
+    body = orjson.dumps(json_data) if json_data is not None else None
+    for attempt in range(retries):
+        if limiter is not None:
+            await limiter.acquire()
+        retry_after = None
+        try:
+            response = await client.request(method.upper(), url, headers=headers, content=body, params=params)
+            if response.status_code < 400 or response.status_code in accept_statuses:
+                try:
+                    return orjson.loads(response.content)
+                except orjson.JSONDecodeError as e:
+                    error_text = response.text
+                    if response.status_code >= 400:
+                        logger.error("响应解析失败: <%s> .错误: %s, 放弃.", e, error_text)
+                        return {}
+                    logger.error("响应解析失败: <%s> .错误: %s, 重试中....", e, error_text)
+            elif response.status_code == 429:
+                error_text = response.text
+                retry_after = response.headers.get("Retry-After")
+                logger.warning("请求被限流(429), 重试中....")
+            elif response.status_code < 500:
+                # 客户端错误重试无意义, 直接放弃
+                error_text = response.text
+                logger.error("请求失败: HTTP %s .错误: %s, 放弃.", response.status_code, error_text)
                 return {}
+            else:
+                error_text = response.text
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error("请求异常: <%s> .错误: %s, 重试中....", e, error_text)
+        if attempt + 1 < retries:
+            await asyncio.sleep(parse_retry_after(retry_after, get_retry_delay(attempt)))
+    logger.error("超过最大重试次数.错误: %s, 放弃.", error_text)
     return {}
 
-def validate_database_structure():
+async def validate_database_structure(client):
     url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}"
-    headers = {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Notion-Version": "2022-06-28",
-    }
-    
+
     try:
-        response = requests.get(url, headers=headers)
+        await notion_limiter.acquire()
+        response = await client.get(url, headers=NOTION_HEADERS)
         response.raise_for_status()
-        database = response.json()
+        database = orjson.loads(response.content)
         
-        # 检查属性类型是否匹配
+        # 检查属性类型是否匹配, 并记录数据库实际使用的类型
+        resolved_types = dict(PROPERTY_TYPES)
         for prop_name, prop_type in PROPERTY_TYPES.items():
             if prop_name in database["properties"]:
                 db_prop_type = database["properties"][prop_name]["type"]
+                resolved_types[prop_name] = db_prop_type
                 if db_prop_type != prop_type:
-                    logger.warning(f"属性 '{prop_name}' 类型不匹配: 数据库是 {db_prop_type}, 代码期望 {prop_type}")
+                    logger.warning("属性 '%s' 类型不匹配: 数据库是 %s, 代码期望 %s", prop_name, db_prop_type, prop_type)
             else:
-                logger.warning(f"数据库中缺少属性: {prop_name}")
+                logger.warning("数据库中缺少属性: %s", prop_name)
         
         logger.info("数据库结构验证完成")
-        return True
+        return DbSchema(
+            completion_kind=resolved_types[PROPERTY_MAPPING["COMPLETION"]],
+            tags_kind=resolved_types[PROPERTY_MAPPING["TAGS"]],
+        )
     except Exception as e:
-        logger.error(f"验证数据库结构失败: {str(e)}")
-        return False
+        logger.error("验证数据库结构失败: %s", e)
+        return None
 
-def get_owned_game_data_from_steam():
+async def get_owned_game_data_from_steam(client):
     url = "http://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/"
     params = {
         "key": STEAM_API_KEY,
         "steamid": STEAM_USER_ID,
-        "include_appinfo": True,
+        "include_appinfo": "true",
         "format": "json"
     }
     
     if include_played_free_games == "true":
-        params["include_played_free_games"] = True
+        params["include_played_free_games"] = "true"
 
     logger.info("从Steam获取数据中..")
 
     try:
-        response = send_request_with_retry(url, params=params, method="get")
+        response = await send_request_with_retry(client, url, params=params, method="get")
         if response:
             logger.info("数据获取成功!")
-            return response.json()
+            return response
         else:
             logger.error("获取Steam数据失败: 无响应")
             return {}
     except Exception as e:
-        logger.error(f"获取Steam数据失败: {e}")
+        logger.error("获取Steam数据失败: %s", e)
         return {}
 
-def query_achievements_info_from_steam(game):
+async def query_achievements_info_from_steam(client, game):
     """查询游戏成就数据，处理各种错误情况"""
     url = "http://api.steampowered.com/ISteamUserStats/GetPlayerAchievements/v0001/"
     params = {
@@ -136,35 +279,76 @@ def query_achievements_info_from_steam(game):
         "appid": game['appid']
     }
     
-    logger.info(f"查询游戏成就数据: {game['name']}")
+    logger.info("查询游戏成就数据: %s", game['name'])
+
+    # 400/403 的响应内容中包含具体原因, 其余错误(429/5xx)交给重试逻辑处理
+    response = await send_request_with_retry(client, url, params=params, method="get", accept_statuses=(400, 403))
+    if not response:
+        logger.error("查询成就失败: %s", game['name'])
+        return None
+
+    error = response.get('playerstats', {}).get('error')
+    if error == 'Profile is not public':
+        logger.warning("用户个人资料未公开，无法获取成就: %s", game['name'])
+        return None
+    if error == 'Requested app has no stats':
+        logger.warning("游戏没有成就数据: %s", game['name'])
+        # 返回一个空成就列表
+        return {"playerstats": {"achievements": []}}
+    if error:
+        logger.error("查询成就失败: %s: %s", game['name'], error)
+        return None
+    return response
+
+def load_achievements_cache():
+    try:
+        with open(ACHIEVEMENTS_CACHE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("成就缓存读取失败, 忽略: %s", e)
+        return {}
 
+def save_achievements_cache(cache):
+    os.makedirs(os.path.dirname(ACHIEVEMENTS_CACHE_PATH), exist_ok=True)
+    tmp_path = ACHIEVEMENTS_CACHE_PATH + ".tmp"
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        # 添加对403和400错误的特殊处理
-        if response.status_code == 403:
-            error_data = response.json()
-            if error_data.get('playerstats', {}).get('error') == 'Profile is not public':
-                logger.warning(f"用户个人资料未公开，无法获取成就: {game['name']}")
-                return None
-        elif response.status_code == 400:
-            error_data = response.json()
-            if error_data.get('playerstats', {}).get('error') == 'Requested app has no stats':
-                logger.warning(f"游戏没有成就数据: {game['name']}")
-                # 返回一个空成就列表
-                return {"playerstats": {"achievements": []}}
-        # 其他HTTP错误
-        error_text = response.text if hasattr(response, 'text') else str(e)
-        logger.error(f"查询成就失败: {game['name']}: {str(e)} .错误: {error_text}")
-    except Exception as e:
-        logger.error(f"查询成就失败: {game['name']}: {str(e)}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, ACHIEVEMENTS_CACHE_PATH)
+    except OSError as e:
+        logger.warning("成就缓存写入失败: %s", e)
+
+def get_cached_achievements(game):
+    """命中缓存时返回成就统计, 否则返回 None"""
+    cached = achievements_cache.get(str(game['appid']))
+    if cached is None:
+        return None
+    # 无成就的游戏在有效期内直接复用
+    if cached["total"] < 1 and time.time() - cached["ts"] < ACHIEVEMENTS_CACHE_TTL:
+        return {"total": cached["total"], "achieved": cached["achieved"]}
+    # 有成就的游戏在游玩时长未变化时复用
+    if cached["total"] > 0 and cached["playtime"] == game["playtime_forever"]:
+        return {"total": cached["total"], "achieved": cached["achieved"]}
     return None
 
-def get_achievements_count(game):
+def cache_achievements(game, achievements_info):
+    achievements_cache[str(game['appid'])] = {
+        "total": achievements_info["total"],
+        "achieved": achievements_info["achieved"],
+        "playtime": game["playtime_forever"],
+        "ts": int(time.time()),
+    }
+
+async def get_achievements_count(client, game):
     """获取游戏成就统计信息，并输出无成就信息"""
-    game_achievements = query_achievements_info_from_steam(game)
+    achievements_info = get_cached_achievements(game)
+    if achievements_info is not None:
+        logger.info("%s 使用成就缓存: %s/%s", game['name'], achievements_info['achieved'], achievements_info['total'])
+        return achievements_info
+
+    game_achievements = await query_achievements_info_from_steam(client, game)
     achievements_info = {}
     achievements_info["total"] = 0
     achievements_info["achieved"] = 0
@@ -173,8 +357,11 @@ def get_achievements_count(game):
     if game_achievements is None or game_achievements.get("playerstats", {}).get("success", False) is False:
         achievements_info["total"] = -1
         achievements_info["achieved"] = -1
-        logger.info(f"游戏无成就信息: {game['name']}")
+        logger.info("游戏无成就信息: %s", game['name'])
         print(f"{game['name']}: 无成就信息（个人资料未公开）")
+        # 请求失败或资料未公开时不缓存, 下次重新查询
+        if game_achievements is not None:
+            cache_achievements(game, achievements_info)
         return achievements_info
 
     # 处理游戏本身无成就的情况
@@ -184,50 +371,64 @@ def get_achievements_count(game):
     if not achievements_list:  # 检查成就列表是否为空
         achievements_info["total"] = 0
         achievements_info["achieved"] = 0
-        logger.info(f"游戏无成就: {game['name']}")
+        logger.info("游戏无成就: %s", game['name'])
         print(f"{game['name']}: 无成就")
+        cache_achievements(game, achievements_info)
         return achievements_info
 
-    # 正常处理有成就的游戏
-    for achievement_dict in achievements_list:
-        achievements_info["total"] += 1
-        if achievement_dict.get("achieved", 0) == 1:
-            achievements_info["achieved"] += 1
+    # 正常处理有成就的游戏, achieved 字段取值为 0/1
+    achievements_info = {
+        "total": len(achievements_list),
+        "achieved": sum(map(operator.itemgetter("achieved"), achievements_list)),
+    }
 
-    logger.info(f"{game['name']} 成就统计完成: {achievements_info['achieved']}/{achievements_info['total']}")
+    logger.info("%s 成就统计完成: %s/%s", game['name'], achievements_info['achieved'], achievements_info['total'])
+    cache_achievements(game, achievements_info)
     return achievements_info
 
-def is_record(game, achievements_info):
-    not_record_time = "2020-01-01 00:00:00"
-    time_tuple = time.strptime(not_record_time, "%Y-%m-%d %H:%M:%S")
-    timestamp = time.mktime(time_tuple)
+# 过滤规则的时间界限, 在此之前最后游玩的游戏视为不活跃
+_NOT_RECORD_TS = time.mktime(time.strptime("2020-01-01 00:00:00", "%Y-%m-%d %H:%M:%S"))
+
+def is_record_cheap(game):
+    """仅根据游玩时长和上次游玩时间过滤, 无需请求任何接口"""
+    playtime = round(float(game["playtime_forever"]) / 60, 1)
+
+    if playtime < 0.1 and game.get("rtime_last_played", 0) < _NOT_RECORD_TS:
+        logger.info("%s 不符合过滤规则!", game['name'])
+        return False
+
+    return True
+
+def is_record_full(game, achievements_info):
     playtime = round(float(game["playtime_forever"]) / 60, 1)
 
     if (playtime < 0.1 and achievements_info["total"] < 1) or (
-        game.get("rtime_last_played", 0) < timestamp
+        game.get("rtime_last_played", 0) < _NOT_RECORD_TS
         and achievements_info["total"] < 1
         and playtime < 6
     ):
-        logger.info(f"{game['name']} 不符合过滤规则!")
+        logger.info("%s 不符合过滤规则!", game['name'])
         return False
 
     return True
 
-def add_item_to_notion_database(game, achievements_info, review_text, steam_store_data):
-    url = "https://api.notion.com/v1/pages"
-    headers = {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28",
-    }
-
-    logger.info(f"添加游戏到Notion: {game['name']}")
-
+def build_tracked_properties(game, achievements_info):
+    """构造随游玩变化的属性, 这部分只依赖 Steam 游戏列表和成就数据"""
     playtime = round(float(game["playtime_forever"]) / 60, 1)
     last_played_time = time.strftime("%Y-%m-%d", time.localtime(game.get("rtime_last_played", 0)))
-    store_url = f"https://store.steampowered.com/app/{game['appid']}"
-    icon_url = f"https://media.steampowered.com/steamcommunity/public/images/apps/{game['appid']}/{game['img_icon_url']}.jpg"
-    cover_url = f"https://steamcdn-a.akamaihd.net/steam/apps/{game['appid']}/header.jpg"
+
+    total_achievements = achievements_info.get("total", 0)
+    achieved_achievements = achievements_info.get("achieved", 0)
+
+    return {
+        PROPERTY_MAPPING["PLAYTIME"]: {"type": "number", "number": playtime},
+        PROPERTY_MAPPING["LAST_PLAYED"]: {"type": "date", "date": {"start": last_played_time}},
+        PROPERTY_MAPPING["TOTAL_ACHIEVEMENTS"]: {"type": "number", "number": total_achievements},
+        PROPERTY_MAPPING["ACHIEVED_ACHIEVEMENTS"]: {"type": "number", "number": achieved_achievements},
+    }
+
+def build_properties(game, achievements_info, review_text, steam_store_data, tags):
+    store_url = STORE_URL_FMT.format(game['appid'])
     
     total_achievements = achievements_info.get("total", 0)
     achieved_achievements = achievements_info.get("achieved", 0)
@@ -242,11 +443,8 @@ def add_item_to_notion_database(game, achievements_info, review_text, steam_stor
             "type": "title",
             "title": [{"type": "text", "text": {"content": game['name']}}]
         },
-        PROPERTY_MAPPING["PLAYTIME"]: {"type": "number", "number": playtime},
-        PROPERTY_MAPPING["LAST_PLAYED"]: {"type": "date", "date": {"start": last_played_time}},
+        **build_tracked_properties(game, achievements_info),
         PROPERTY_MAPPING["STORE_URL"]: {"type": "url", "url": store_url},
-        PROPERTY_MAPPING["TOTAL_ACHIEVEMENTS"]: {"type": "number", "number": total_achievements},
-        PROPERTY_MAPPING["ACHIEVED_ACHIEVEMENTS"]: {"type": "number", "number": achieved_achievements},
         PROPERTY_MAPPING["REVIEW"]: {
             "type": "rich_text",
             "rich_text": [{"type": "text", "text": {"content": review_text}}]
@@ -257,190 +455,203 @@ def add_item_to_notion_database(game, achievements_info, review_text, steam_stor
         }
     }
     
-    # 调整完成度属性为多选类型
-    if PROPERTY_TYPES.get(PROPERTY_MAPPING["COMPLETION"], "") == "multi_select":
-        completion_value = []
-        if completion >= 0:
-            completion_value = [{"name": f"{completion}%"}]
-        properties[PROPERTY_MAPPING["COMPLETION"]] = {
-            "type": "multi_select",
-            "multi_select": completion_value
-        }
-    else:  # 默认使用数字类型
-        properties[PROPERTY_MAPPING["COMPLETION"]] = {"type": "number", "number": completion}
-    
-    # 调整游戏标签属性为多选类型
-    if PROPERTY_TYPES.get(PROPERTY_MAPPING["TAGS"], "") == "checkbox":
-        has_tags = len(steam_store_data.get('tag', [])) > 0
-        properties[PROPERTY_MAPPING["TAGS"]] = {
-            "type": "checkbox",
-            "checkbox": has_tags
-        }
-    else:  # 默认使用多选类型
-        # 确保标签格式正确 - 每个标签应该是 {"name": "标签名称"} 格式
-        tags = []
-        for tag in steam_store_data.get('tag', []):
-            if isinstance(tag, dict):
-        # 如果标签已经是字典格式，确保它有 'name' 字段
-                if 'name' in tag:
-                    tags.append({"name": tag['name']})
-                else:
-        # 处理没有 'name' 字段的情况
-                    logger.warning(f"无效标签格式: {tag}")
-            else:
-        # 如果标签是字符串，直接使用
-                tags.append({"name": str(tag)})
-        properties[PROPERTY_MAPPING["TAGS"]] = {
-            "type": "multi_select",
-            "multi_select": tags
-        }
+    properties[PROPERTY_MAPPING["COMPLETION"]] = _build_completion(completion)
+    properties[PROPERTY_MAPPING["TAGS"]] = _build_tags(tags)
+
+    return properties
 
-    data = {
-        "parent": {"type": "database_id", "database_id": NOTION_DATABASE_ID},
-        "properties": properties,
+def build_item_data(game, achievements_info, review_text, steam_store_data, tags):
+    icon_url = ICON_URL_FMT.format(game['appid'], game['img_icon_url'])
+    cover_url = COVER_URL_FMT.format(game['appid'])
+
+    return {
+        "properties": build_properties(game, achievements_info, review_text, steam_store_data, tags),
         "cover": {"type": "external", "external": {"url": cover_url}},
         "icon": {"type": "external", "external": {"url": icon_url}},
     }
 
+async def add_item_to_notion_database(client, game, data):
+    url = "https://api.notion.com/v1/pages"
+
+    logger.info("添加游戏到Notion: %s", game['name'])
+
+    data = {"parent": {"type": "database_id", "database_id": NOTION_DATABASE_ID}, **data}
+
     try:
-        response = send_request_with_retry(url, headers=headers, json_data=data, method="post")
+        response = await send_request_with_retry(client, url, headers=NOTION_HEADERS, json_data=data, method="post")
         if response:
-            logger.info(f"{game['name']} 添加成功!")
-            return response.json()
+            logger.info("%s 添加成功!", game['name'])
+            return response
         return {}
     except Exception as e:
-        logger.error(f"添加失败: {e}")
+        logger.error("添加失败: %s", e)
         return {}
 
-def query_item_from_notion_database(game):
+def properties_fingerprint(properties):
+    """对会随游玩变化的属性计算摘要, 用于跳过无变化的更新"""
+    def number(key):
+        value = properties.get(PROPERTY_MAPPING[key], {}).get("number")
+        return None if value is None else float(value)
+
+    last_played = (properties.get(PROPERTY_MAPPING["LAST_PLAYED"], {}).get("date") or {}).get("start")
+    key = (number("PLAYTIME"), number("ACHIEVED_ACHIEVEMENTS"), number("TOTAL_ACHIEVEMENTS"), last_played)
+    return hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+
+async def query_all_items_from_notion_database(client):
+    """分页拉取数据库中全部条目, 返回 {游戏名称: (page_id, 属性摘要)}"""
     url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
-    headers = {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28",
-    }
 
-    logger.info(f"在数据库中查询游戏: {game['name']}")
-    
-    data = {
-        "filter": {
-            "property": PROPERTY_MAPPING["TITLE"],
-            "title": {
-                "equals": game['name']
-            }
-        }
-    }
+    logger.info("从Notion获取已有条目中..")
 
-    try:
-        response = send_request_with_retry(
-            url, headers=headers, json_data=data, method="post"
+    title_property = PROPERTY_MAPPING["TITLE"]
+    existing_pages = {}
+    data = {"page_size": 100}
+    while True:
+        response = await send_request_with_retry(
+            client, url, headers=NOTION_HEADERS, json_data=data, method="post"
         )
-        if response:
-            logger.info("查询完成!")
-            return response.json()
-        return {"results": []}
-    except Exception as e:
-        logger.error(f"查询失败: {e}")
-        return {"results": []}
+        results = response.get("results")
+        if not isinstance(results, list):
+            logger.error("查询失败!")
+            return None
+
+        for page in results:
+            properties = page.get("properties", {})
+            title = properties.get(title_property, {}).get("title")
+            if title:
+                # 标题可能由多段富文本组成, 拼接后才是完整名称
+                existing_pages.setdefault(
+                    "".join(t.get("plain_text", "") for t in title), (page["id"], properties_fingerprint(properties))
+                )
 
-def update_item_to_notion_database(page_id, game, achievements_info, review_text, steam_store_data):
-    url = f"https://api.notion.com/v1/pages/{page_id}"
-    headers = {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28",
-    }
+        next_cursor = response.get("next_cursor")
+        if not response.get("has_more") or not next_cursor:
+            break
+        data["start_cursor"] = next_cursor
 
-    playtime = round(float(game["playtime_forever"]) / 60, 1)
-    last_played_time = time.strftime("%Y-%m-%d", time.localtime(game.get("rtime_last_played", 0)))
-    store_url = f"https://store.steampowered.com/app/{game['appid']}"
-    icon_url = f"https://media.steampowered.com/steamcommunity/public/images/apps/{game['appid']}/{game['img_icon_url']}.jpg"
-    cover_url = f"https://steamcdn-a.akamaihd.net/steam/apps/{game['appid']}/header.jpg"
-    
-    total_achievements = achievements_info.get("total", 0)
-    achieved_achievements = achievements_info.get("achieved", 0)
-    
-    completion = -1
-    if total_achievements > 0:
-        completion = round(float(achieved_achievements) / float(total_achievements) * 100, 1)
+    logger.info("查询完成! 共 %s 个条目", len(existing_pages))
+    return existing_pages
 
-    logger.info(f"更新游戏信息: {game['name']}")
+async def update_item_to_notion_database(client, page_id, game, data):
+    url = f"https://api.notion.com/v1/pages/{page_id}"
 
-    # 根据数据库实际类型调整属性格式
-    properties = {
-        PROPERTY_MAPPING["TITLE"]: {
-            "type": "title",
-            "title": [{"type": "text", "text": {"content": game['name']}}]
-        },
-        PROPERTY_MAPPING["PLAYTIME"]: {"type": "number", "number": playtime},
-        PROPERTY_MAPPING["LAST_PLAYED"]: {"type": "date", "date": {"start": last_played_time}},
-        PROPERTY_MAPPING["STORE_URL"]: {"type": "url", "url": store_url},
-        PROPERTY_MAPPING["TOTAL_ACHIEVEMENTS"]: {"type": "number", "number": total_achievements},
-        PROPERTY_MAPPING["ACHIEVED_ACHIEVEMENTS"]: {"type": "number", "number": achieved_achievements},
-        PROPERTY_MAPPING["REVIEW"]: {
-            "type": "rich_text",
-            "rich_text": [{"type": "text", "text": {"content": review_text}}]
-        },
-        PROPERTY_MAPPING["INFO"]: {
-            "type": "rich_text",
-            "rich_text": [{"type": "text", "text": {"content": steam_store_data.get("info", "")}}]
-        }
-    }
-    
-    # 调整完成度属性为多选类型
-    if PROPERTY_TYPES.get(PROPERTY_MAPPING["COMPLETION"], "") == "multi_select":
-        completion_value = []
-        if completion >= 0:
-            completion_value = [{"name": f"{completion}%"}]
-        properties[PROPERTY_MAPPING["COMPLETION"]] = {
-            "type": "multi_select",
-            "multi_select": completion_value
-        }
-    else:  # 默认使用数字类型
-        properties[PROPERTY_MAPPING["COMPLETION"]] = {"type": "number", "number": completion}
-    
-    # 调整游戏标签属性为多选类型
-    if PROPERTY_TYPES.get(PROPERTY_MAPPING["TAGS"], "") == "checkbox":
-        has_tags = len(steam_store_data.get('tag', [])) > 0
-        properties[PROPERTY_MAPPING["TAGS"]] = {
-            "type": "checkbox",
-            "checkbox": has_tags
-        }
-    else:  # 默认使用多选类型
-        # 确保标签格式正确 - 每个标签应该是 {"name": "标签名称"} 格式
-            tags = []
-            for tag in steam_store_data.get('tag', []):
-                if isinstance(tag, dict):
-        # 如果标签已经是字典格式，确保它有 'name' 字段
-                    if 'name' in tag:
-                        tags.append({"name": tag['name']})
-                    else:
-        # 处理没有 'name' 字段的情况
-                        logger.warning(f"无效标签格式: {tag}")
-                else:
-        # 如果标签是字符串，直接使用
-                    tags.append({"name": str(tag)})
-            properties[PROPERTY_MAPPING["TAGS"]] = {
-                "type": "multi_select",
-                "multi_select": tags
-            }
-
-    data = {
-        "properties": properties,
-        "cover": {"type": "external", "external": {"url": cover_url}},
-        "icon": {"type": "external", "external": {"url": icon_url}},
-    }
+    logger.info("更新游戏信息: %s", game['name'])
 
     try:
-        response = send_request_with_retry(url, headers=headers, json_data=data, method="patch")
+        response = await send_request_with_retry(client, url, headers=NOTION_HEADERS, json_data=data, method="patch")
         if response:
-            logger.info(f"{game['name']} 更新成功!")
-            return response.json()
+            logger.info("%s 更新成功!", game['name'])
+            return response
         return {}
     except Exception as e:
-        logger.error(f"更新失败: {e}")
+        logger.error("更新失败: %s", e)
         return {}
 
+async def process_game(client, sem, game, existing_pages):
+    async with sem:
+        if "rtime_last_played" not in game:
+            logger.info("%s 无最后游玩时间! 设置为0", game['name'])
+            game["rtime_last_played"] = 0
+
+        # 先用本地数据过滤, 跳过的游戏不再发起任何请求
+        if enable_filter == "true" and not is_record_cheap(game):
+            return None
+
+        existing_page = existing_pages.get(game['name'])
+        if existing_page is not None and enable_item_update != "true":
+            logger.info("%s 已存在! 跳过", game['name'])
+            return None
+
+        if enable_filter == "true" or existing_page is not None:
+            # 过滤和变化检测只依赖成就数据, 通过后再并发抓取评测和商店信息
+            achievements_info = await get_achievements_count(client, game)
+            if enable_filter == "true" and not is_record_full(game, achievements_info):
+                return None
+            if existing_page is not None:
+                fingerprint = properties_fingerprint(build_tracked_properties(game, achievements_info))
+                if fingerprint == existing_page[1]:
+                    logger.info("%s 无变化! 跳过", game['name'])
+                    return None
+            review_text, steam_store_data = await asyncio.gather(
+                get_steam_review_info(client, game["appid"], STEAM_USER_ID, steam_web_limiter),
+                get_steam_store_info(client, game["appid"], steam_web_limiter),
+            )
+        else:
+            achievements_info, review_text, steam_store_data = await asyncio.gather(
+                get_achievements_count(client, game),
+                get_steam_review_info(client, game["appid"], STEAM_USER_ID, steam_web_limiter),
+                get_steam_store_info(client, game["appid"], steam_web_limiter),
+            )
+        logger.info("%s 评测: %s", game['name'], review_text)
+        tags = normalize_tags(steam_store_data.get('tag', []))
+        data = build_item_data(game, achievements_info, review_text, steam_store_data, tags)
+
+        if existing_page is None:
+            logger.info("%s 不存在! 创建新条目", game['name'])
+            return ("add", None, game, data)
+        logger.info("%s 已存在! 更新中...", game['name'])
+        return ("update", existing_page[0], game, data)
+
+async def write_item_to_notion_database(client, sem, op, page_id, game, data):
+    async with sem:
+        if op == "add":
+            return await add_item_to_notion_database(client, game, data)
+        return await update_item_to_notion_database(client, page_id, game, data)
+
+async def main():
+    # 不设置默认请求头, 避免 Notion 令牌被发送到 Steam
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=KEEPALIVE_TIMEOUT)
+    async with httpx.AsyncClient(http2=True, limits=limits, timeout=REQUEST_TIMEOUT, follow_redirects=True) as client:
+        # 数据库验证、Steam游戏列表和Notion已有条目互不依赖, 并发获取
+        schema, owned_game_data, existing_pages = await asyncio.gather(
+            validate_database_structure(client),
+            get_owned_game_data_from_steam(client),
+            query_all_items_from_notion_database(client),
+        )
+
+        if schema is None:
+            logger.error("数据库结构验证失败，请检查属性配置")
+            exit(1)
+        apply_database_schema(schema)
+
+        if not owned_game_data or "response" not in owned_game_data or "games" not in owned_game_data["response"]:
+            logger.error("无法获取Steam游戏数据，请检查API密钥和用户ID")
+            exit(1)
+
+        if existing_pages is None:
+            logger.error("无法获取Notion数据库条目，请检查API密钥和数据库ID")
+            exit(1)
+
+        games = owned_game_data["response"]["games"]
+        achievements_cache.update(load_achievements_cache())
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        try:
+            # 单个游戏出错只跳过该游戏, 不影响其他游戏写入
+            results = await asyncio.gather(
+                *[process_game(client, sem, game, existing_pages) for game in games],
+                return_exceptions=True,
+            )
+        finally:
+            save_achievements_cache(achievements_cache)
+
+        # 统一写入 Notion: 收集全部待写入条目后按固定并发度发送
+        write_ops = []
+        for game, result in zip(games, results):
+            if isinstance(result, Exception):
+                logger.error("%s 处理失败, 跳过: %r", game.get('name', game.get('appid')), result)
+            elif result is not None:
+                write_ops.append(result)
+
+        logger.info("待写入Notion条目: %s", len(write_ops))
+        write_sem = asyncio.Semaphore(NOTION_WRITE_CONCURRENCY)
+        results = await asyncio.gather(
+            *[write_item_to_notion_database(client, write_sem, *write_op) for write_op in write_ops],
+            return_exceptions=True,
+        )
+        for write_op, result in zip(write_ops, results):
+            if isinstance(result, Exception):
+                logger.error("%s 写入失败: %r", write_op[2]['name'], result)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--debug', action='store_true', help='启用调试日志输出')
@@ -466,51 +677,12 @@ if __name__ == "__main__":
     
     # 记录环境变量配置
     logger.debug("环境变量配置:")
-    logger.debug(f"STEAM_API_KEY: {STEAM_API_KEY[:4]}...")
-    logger.debug(f"STEAM_USER_ID: {STEAM_USER_ID}")
-    logger.debug(f"NOTION_API_KEY: {NOTION_API_KEY[:6]}...")
-    logger.debug(f"NOTION_DATABASE_ID: {NOTION_DATABASE_ID}")
-    logger.debug(f"include_played_free_games: {include_played_free_games}")
-    logger.debug(f"enable_item_update: {enable_item_update}")
-    logger.debug(f"enable_filter: {enable_filter}")
-    
-    # 添加数据库验证
-    if not validate_database_structure():
-        logger.error("数据库结构验证失败，请检查属性配置")
-        exit(1)
-        
-    owned_game_data = get_owned_game_data_from_steam()
-    
-    if not owned_game_data or "response" not in owned_game_data or "games" not in owned_game_data["response"]:
-        logger.error("无法获取Steam游戏数据，请检查API密钥和用户ID")
-        exit(1)
-    
-    for game in owned_game_data["response"]["games"]:
-        achievements_info = get_achievements_count(game)
-        review_text = get_steam_review_info(game["appid"], STEAM_USER_ID)
-        steam_store_data = get_steam_store_info(game["appid"])
-        logger.info(f"{game['name']} 评测: {review_text}")
-
-        if "rtime_last_played" not in game:
-            logger.info(f"{game['name']} 无最后游玩时间! 设置为0")
-            game["rtime_last_played"] = 0
-
-        if enable_filter == "true" and not is_record(game, achievements_info):
-            continue
-
-        queryed_item = query_item_from_notion_database(game)
-        if "results" not in queryed_item:
-            logger.error(f"{game['name']} 查询失败! 跳过")
-            continue
-
-        if queryed_item["results"]:
-            if enable_item_update == "true":
-                logger.info(f"{game['name']} 已存在! 更新中...")
-                update_item_to_notion_database(
-                    queryed_item["results"][0]["id"], game, achievements_info, review_text, steam_store_data
-                )
-            else:
-                logger.info(f"{game['name']} 已存在! 跳过")
-        else:
-            logger.info(f"{game['name']} 不存在! 创建新条目")
-            add_item_to_notion_database(game, achievements_info, review_text, steam_store_data)
+    logger.debug("STEAM_API_KEY: %s...", STEAM_API_KEY[:4])
+    logger.debug("STEAM_USER_ID: %s", STEAM_USER_ID)
+    logger.debug("NOTION_API_KEY: %s...", NOTION_API_KEY[:6])
+    logger.debug("NOTION_DATABASE_ID: %s", NOTION_DATABASE_ID)
+    logger.debug("include_played_free_games: %s", include_played_free_games)
+    logger.debug("enable_item_update: %s", enable_item_update)
+    logger.debug("enable_filter: %s", enable_filter)
+
+    asyncio.run(main())